@@ -1,14 +1,95 @@
 #!/usr/bin/env python3
 
 import os
+import json
+import shutil
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from lxml import html
 import urllib.parse
 import argparse
 from tqdm import tqdm
 import concurrent.futures
 
-def download_file(url, output_dir, overwrite=False):
+# 接続タイムアウトと読み込みタイムアウト（秒）
+REQUEST_TIMEOUT = (10, 60)
+
+# ダウンロード時の読み書き単位（バイト）
+CHUNK_SIZE = 1 << 20
+
+# プログレスバーの表示更新間隔（秒）
+PROGRESS_INTERVAL = 0.5
+
+# 分割ダウンロードで1区間あたりに割り当てる最小バイト数
+MIN_SEGMENT_SIZE = 8 * 1024 * 1024
+
+# ファイルリストのキャッシュファイル名（出力ディレクトリに保存）
+LISTING_CACHE_FILE = '.nc_listing_cache.json'
+
+def create_session(workers):
+    """
+    接続を再利用するためのrequests.Sessionを作成する関数
+    
+    同じホストへの接続をワーカー間で使い回し、ファイルごとのTCP/TLSハンドシェイクを省く。
+    
+    Args:
+        workers (int): 並列ダウンロードのワーカー数（コネクションプールのサイズに使用）
+    
+    Returns:
+        requests.Session: リトライ設定済みのセッション
+    """
+    session = requests.Session()
+    retry = Retry(total=3, backoff_factor=0.5, status_forcelist=[500, 502, 503, 504])
+    adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers * 2, max_retries=retry)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+def download_ranges(url, output_path, total_size, segments, http, pbar):
+    """
+    HTTP Rangeリクエストでファイルを複数の区間に分けて並列にダウンロードする関数
+    
+    出力ファイルを事前に確保し、各区間のデータを該当するオフセットに直接書き込む。
+    
+    Args:
+        url (str): ダウンロードするファイルのURL
+        output_path (str): 保存先のファイルパス
+        total_size (int): ファイルサイズ（バイト）
+        segments (int): 分割数
+        http: requests.Sessionまたはrequestsモジュール
+        pbar (tqdm): 進捗を更新するプログレスバー
+    """
+    segment_size = -(-total_size // segments)
+    bounds = [(lo, min(lo + segment_size, total_size) - 1) for lo in range(0, total_size, segment_size)]
+    
+    def fetch(lo, hi):
+        response = http.get(url, headers={'Range': f'bytes={lo}-{hi}'}, stream=True, timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()
+        if response.status_code != 206:
+            raise IOError(f"Rangeリクエストに対応していない応答です（ステータス: {response.status_code}）")
+        
+        offset = lo
+        for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+            if chunk:
+                os.pwrite(fd, chunk, offset)
+                offset += len(chunk)
+                pbar.update(len(chunk))
+        
+        if offset != hi + 1:
+            raise IOError(f"区間 {lo}-{hi} のダウンロードが途中で終了しました")
+    
+    fd = os.open(output_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC)
+    try:
+        os.ftruncate(fd, total_size)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(bounds)) as executor:
+            futures = [executor.submit(fetch, lo, hi) for lo, hi in bounds]
+            for future in futures:
+                future.result()
+    finally:
+        os.close(fd)
+
+def download_file(url, output_dir, overwrite=False, session=None, segments=1):
     """
     指定されたURLからファイルをダウンロードする関数
     
@@ -16,35 +97,100 @@ def download_file(url, output_dir, overwrite=False):
         url (str): ダウンロードするファイルのURL
         output_dir (str): ダウンロードしたファイルを保存するディレクトリ
         overwrite (bool): 既存のファイルを上書きするかどうか
+        session (requests.Session, optional): 使用するセッション（指定しない場合は接続を再利用しない）
+        segments (int): 大きなファイルを分割して並列ダウンロードする際の最大分割数（1は分割しない）
     
     Returns:
         bool: ダウンロードが成功したかどうか
     """
+    http = session or requests
+    
     # URLからファイル名を取得
     filename = urllib.parse.unquote(os.path.basename(url))
     output_path = os.path.join(output_dir, filename)
     
-    # 既にファイルが存在し、上書きしない設定の場合はスキップ
+    head = None
+    resume_from = 0
+    keep_partial = False
+    # このダウンロードでファイルへの書き込みを始めたかどうか（始める前の失敗では既存のファイルを消さない）
+    started = False
+    
+    # 既にファイルが存在し、上書きしない設定の場合はサーバー上のサイズと比較する
     if os.path.exists(output_path) and not overwrite:
-        print(f"ファイルが既に存在します: {filename} (スキップ)")
-        return False
+        local_size = os.path.getsize(output_path)
+        try:
+            head = http.head(url, allow_redirects=True, timeout=REQUEST_TIMEOUT)
+            head.raise_for_status()
+        except requests.RequestException as e:
+            # サイズを確認できない場合は、既存のファイルをそのまま残す
+            print(f"ファイルが既に存在します: {filename} (サーバー上のサイズを確認できないためスキップ: {str(e)})")
+            return False
+        remote_size = int(head.headers.get('content-length', -1))
+        
+        # サイズが一致する（またはサーバー上のサイズが不明な）場合はスキップ
+        if remote_size < 0 or local_size == remote_size:
+            print(f"ファイルが既に存在します: {filename} (スキップ)")
+            return False
+        
+        # 途中までのファイルで、サーバーがRangeリクエストに対応していれば続きから再開する
+        if 0 < local_size < remote_size and 'bytes' in head.headers.get('accept-ranges', ''):
+            resume_from = local_size
+            print(f"途中までダウンロードされたファイルを再開します: {filename} ({local_size}/{remote_size} バイト)")
+        else:
+            print(f"ファイルサイズが一致しないため再ダウンロードします: {filename}")
     
     try:
+        # 分割ダウンロード（サーバーがRangeリクエストに対応している場合のみ）
+        if segments > 1 and resume_from == 0 and hasattr(os, 'pwrite'):
+            if head is None:
+                # HEADリクエストに対応していないサーバーでは、分割せずに通常のダウンロードを行う
+                try:
+                    head = http.head(url, allow_redirects=True, timeout=REQUEST_TIMEOUT)
+                    head.raise_for_status()
+                except requests.RequestException as e:
+                    print(f"ファイルサイズを取得できないため、分割せずにダウンロードします: {filename} ({str(e)})")
+                    head = None
+            total_size = int(head.headers.get('content-length', 0)) if head is not None else 0
+            n_segments = min(segments, total_size // MIN_SEGMENT_SIZE)
+            if n_segments > 1 and 'bytes' in head.headers.get('accept-ranges', ''):
+                # 事前確保したファイルが中断後に完了済みと誤認されないよう、一時ファイルに書き込む
+                part_path = output_path + '.part'
+                try:
+                    with tqdm(total=total_size, unit='B', unit_scale=True, desc=filename,
+                              mininterval=PROGRESS_INTERVAL) as pbar:
+                        download_ranges(url, part_path, total_size, n_segments, http, pbar)
+                    os.replace(part_path, output_path)
+                finally:
+                    if os.path.exists(part_path):
+                        os.remove(part_path)
+                print(f"ダウンロード完了: {filename}（{n_segments}分割）")
+                return True
+        
         # ファイルのダウンロード
-        response = requests.get(url, stream=True)
+        headers = {'Range': f'bytes={resume_from}-'} if resume_from else {}
+        response = http.get(url, headers=headers, stream=True, timeout=REQUEST_TIMEOUT)
         response.raise_for_status()  # エラーがあれば例外を発生させる
         
+        # サーバーが続きから送ってきた場合のみ追記する（Rangeが無視された場合は最初から書き直す）
+        if response.status_code != 206:
+            resume_from = 0
+        keep_partial = 'bytes' in response.headers.get('accept-ranges', '') or resume_from > 0
+        
         # ファイルサイズを取得（ヘッダーに含まれている場合）
         total_size = int(response.headers.get('content-length', 0))
         
         # ファイルを保存
-        with open(output_path, 'wb') as f:
+        started = True
+        with open(output_path, 'ab' if resume_from else 'wb') as f:
             if total_size == 0:  # ファイルサイズが不明の場合
-                f.write(response.content)
+                # 全体をメモリに読み込まず、CHUNK_SIZE単位でそのままファイルに書き出す
+                response.raw.decode_content = True
+                shutil.copyfileobj(response.raw, f, length=CHUNK_SIZE)
             else:
                 # プログレスバー付きでダウンロード
-                with tqdm(total=total_size, unit='B', unit_scale=True, desc=filename) as pbar:
-                    for chunk in response.iter_content(chunk_size=8192):
+                with tqdm(total=resume_from + total_size, initial=resume_from, unit='B', unit_scale=True,
+                          desc=filename, mininterval=PROGRESS_INTERVAL) as pbar:
+                    for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
                         if chunk:
                             f.write(chunk)
                             pbar.update(len(chunk))
@@ -54,40 +200,96 @@ def download_file(url, output_dir, overwrite=False):
     
     except Exception as e:
         print(f"ダウンロード失敗: {filename} - エラー: {str(e)}")
-        # 部分的にダウンロードされたファイルを削除
-        if os.path.exists(output_path):
+        # 部分的にダウンロードされたファイルは、次回続きから再開できる場合は残し、それ以外は削除
+        # （書き込みを始める前に失敗した場合は、既存のファイルに手を付けない）
+        if started and keep_partial:
+            print(f"途中までのファイルを残しました（次回の実行で再開します）: {filename}")
+        elif started and os.path.exists(output_path):
             os.remove(output_path)
         return False
 
-def get_nc_file_urls(base_url):
+def load_listing_cache(cache_file):
+    """
+    ファイルリストのキャッシュを読み込む関数
+    
+    Args:
+        cache_file (str): キャッシュファイルのパス
+    
+    Returns:
+        dict: URLをキーとしたキャッシュ（ファイルがない、または壊れている場合は空の辞書）
+    """
+    try:
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_listing_cache(cache_file, cache):
+    """
+    ファイルリストのキャッシュを保存する関数
+    
+    Args:
+        cache_file (str): キャッシュファイルのパス
+        cache (dict): URLをキーとしたキャッシュ
+    """
+    try:
+        with open(cache_file, 'w', encoding='utf-8') as f:
+            json.dump(cache, f, ensure_ascii=False, indent=2)
+    except OSError as e:
+        print(f"警告: ファイルリストのキャッシュを保存できませんでした: {str(e)}")
+
+def get_nc_file_urls(base_url, session=None, cache_file=None):
     """
     指定されたURLからNetCDFファイル(.nc)のURLリストを取得する関数
     
+    cache_fileを指定すると、前回のETag/Last-Modifiedを使った条件付きリクエストを行い、
+    ページが更新されていなければ（304）前回解析したURLリストをそのまま返す。
+    
     Args:
         base_url (str): スクレイピング対象のベースURL
+        session (requests.Session, optional): 使用するセッション
+        cache_file (str, optional): ファイルリストのキャッシュファイルのパス
     
     Returns:
         list: NetCDFファイルのURLリスト
     """
+    http = session or requests
+    cache = load_listing_cache(cache_file) if cache_file else {}
+    entry = cache.get(base_url)
+    
+    # 前回の検証子があれば条件付きリクエストにする
+    headers = {}
+    if entry:
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+    
     try:
         # ウェブページを取得
-        response = requests.get(base_url)
+        response = http.get(base_url, headers=headers, timeout=REQUEST_TIMEOUT)
+        if response.status_code == 304 and entry:
+            print("ファイルリストは前回から更新されていません（キャッシュを使用します）")
+            return entry['urls']
         response.raise_for_status()
         
-        # HTMLを解析
-        soup = BeautifulSoup(response.text, 'html.parser')
+        # HTMLを解析し、.ncで終わるリンクのhref属性だけをXPathで抽出
+        tree = html.fromstring(response.content)
+        hrefs = tree.xpath("//a[substring(@href, string-length(@href) - 2) = '.nc']/@href")
         
-        # リンクを抽出
-        links = soup.find_all('a')
+        # 相対URLを絶対URLに変換してURLリストを作成
+        nc_urls = [urllib.parse.urljoin(base_url, href) for href in hrefs]
         
-        # .ncファイルのURLリストを作成
-        nc_urls = []
-        for link in links:
-            href = link.get('href')
-            if href and href.endswith('.nc'):
-                # 相対URLを絶対URLに変換
-                full_url = urllib.parse.urljoin(base_url, href)
-                nc_urls.append(full_url)
+        # 検証子が返された場合のみキャッシュに保存
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if cache_file and (etag or last_modified):
+            cache[base_url] = {
+                'etag': etag,
+                'last_modified': last_modified,
+                'urls': nc_urls
+            }
+            save_listing_cache(cache_file, cache)
         
         return nc_urls
     
@@ -106,17 +308,25 @@ def main():
                         help='ダウンロードするファイル数の上限（0は無制限）')
     parser.add_argument('--overwrite', '-w', action='store_true',
                         help='既存のファイルを上書きする')
-    parser.add_argument('--workers', '-p', type=int, default=3,
-                        help='並列ダウンロードのワーカー数')
+    parser.add_argument('--workers', '-p', type=int, default=8,
+                        help='並列ダウンロードのワーカー数（デフォルト: 8）')
+    parser.add_argument('--no-cache', '-n', action='store_true',
+                        help='ファイルリストのキャッシュを使用しない')
+    parser.add_argument('--segments', '-s', type=int, default=1,
+                        help='大きなファイルをHTTP Rangeリクエストで分割して並列ダウンロードする際の最大分割数（1は分割しない）')
     
     args = parser.parse_args()
     
     # 出力ディレクトリの作成
     os.makedirs(args.output, exist_ok=True)
     
+    # ワーカー間で共有するセッション
+    session = create_session(args.workers * max(args.segments, 1))
+    
     # NetCDFファイルのURLリストを取得
     print(f"{args.url} からファイルリストを取得中...")
-    nc_urls = get_nc_file_urls(args.url)
+    cache_file = None if args.no_cache else os.path.join(args.output, LISTING_CACHE_FILE)
+    nc_urls = get_nc_file_urls(args.url, session, cache_file)
     
     if not nc_urls:
         print("ダウンロード可能なNetCDFファイルが見つかりませんでした。")
@@ -132,7 +342,8 @@ def main():
     # 並列ダウンロードの実行
     with concurrent.futures.ThreadPoolExecutor(max_workers=args.workers) as executor:
         # ダウンロードタスクを作成
-        futures = [executor.submit(download_file, url, args.output, args.overwrite) for url in nc_urls]
+        futures = [executor.submit(download_file, url, args.output, args.overwrite, session, args.segments)
+                   for url in nc_urls]
         
         # 結果を集計
         success_count = 0
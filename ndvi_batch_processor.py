@@ -4,11 +4,31 @@ import os
 import csv
 import subprocess
 import argparse
-import glob
+import re
+import numpy as np
 import pandas as pd
 from datetime import datetime
 import concurrent.futures
 import sys
+import shutil
+
+import netcdf_visualizer
+
+# ファイル名中の「_」で区切られた8桁の日付（YYYYMMDD）
+DATE_PATTERN = re.compile(r'(?<![^_])\s*(\d{8})\s*(?=_)')
+
+# 全地点の領域を囲む範囲の面積が、各地点の領域の面積の合計のこの倍率以下であれば、
+# 地点ごとに読み込まずに囲む範囲を一度に読み込む
+DENSE_READ_RATIO = 4
+
+# 全地点・全日付の統計情報をまとめて書き出すCSVファイルの名前と列
+STATS_FILE_NAME = 'ndvi_stats.csv'
+STATS_FIELDS = ['地点No', '対象地域', '中心緯度', '中心経度', 'メッシュサイズ(km)', '日付',
+                '平均NDVI', '最大NDVI', '最小NDVI', '中央値NDVI', '標準偏差',
+                '有効ピクセル数', '総ピクセル数', '有効データ率(%)']
+
+# 並列処理時にワーカーごとの統計情報を書き出す一時ディレクトリの名前
+STATS_SHARD_DIR_NAME = '.ndvi_stats_shards'
 
 def parse_arguments():
     """コマンドライン引数を解析する関数"""
@@ -25,8 +45,14 @@ def parse_arguments():
                         help='並列処理のワーカー数（デフォルト: 1）')
     parser.add_argument('--summary', '-s', action='store_true',
                         help='処理後に結果をまとめたCSVファイルを作成する')
+    parser.add_argument('--parquet', '-a', action='store_true',
+                        help='サマリーファイルをParquet形式（zstd圧縮）でも出力する（pyarrowが必要）')
     parser.add_argument('--test', '-t', action='store_true',
                         help='テストモード（最初の1つの.ncファイルのみ処理）')
+    parser.add_argument('--subprocess', '-l', action='store_true',
+                        help='従来の方式でnetcdf_visualizer.pyをサブプロセスとして実行する（画像も出力される）')
+    parser.add_argument('--verbose', '-v', action='store_true',
+                        help='従来の方式でサブプロセスの標準出力を表示する')
     
     return parser.parse_args()
 
@@ -51,14 +77,12 @@ def read_points(csv_file):
 
 def find_nc_files(nc_dir):
     """ディレクトリ内の.ncファイルを検索する関数"""
+    # ディレクトリを1回だけ走査し、拡張子の大文字・小文字を区別せずに.ncファイルを集める
     nc_files = []
-    for ext in ['*.nc', '*.NC']:
-        # 絶対パスを使用してファイルを検索
-        pattern = os.path.join(os.path.abspath(nc_dir), ext)
-        found_files = glob.glob(pattern)
-        if not found_files:
-            print(f"警告: パターン '{pattern}' に一致するファイルが見つかりませんでした")
-        nc_files.extend(found_files)
+    with os.scandir(os.path.abspath(nc_dir)) as it:
+        for entry in it:
+            if entry.is_file() and entry.name.lower().endswith('.nc'):
+                nc_files.append((entry.path, entry.name))
     
     if not nc_files:
         print(f"警告: ディレクトリ '{nc_dir}' に.ncファイルが見つかりませんでした")
@@ -68,21 +92,15 @@ def find_nc_files(nc_dir):
     
     # 日付情報を抽出してソート
     nc_files_with_date = []
-    for nc_file in nc_files:
-        filename = os.path.basename(nc_file)
+    for nc_file, filename in nc_files:
         date_str = None
-        if "_" in filename:
-            parts = filename.split("_")
-            for part in parts:
-                # 空白を削除して処理
-                part = part.strip()
-                if len(part) == 8 and part.isdigit():
-                    try:
-                        date = datetime.strptime(part, '%Y%m%d')
-                        date_str = part
-                        break
-                    except ValueError:
-                        continue
+        for match in DATE_PATTERN.finditer(filename):
+            try:
+                datetime.strptime(match.group(1), '%Y%m%d')
+                date_str = match.group(1)
+                break
+            except ValueError:
+                continue
         
         if date_str:
             nc_files_with_date.append((nc_file, date_str))
@@ -91,29 +109,256 @@ def find_nc_files(nc_dir):
     
     if not nc_files_with_date:
         print("警告: 日付情報を持つ.ncファイルが見つかりませんでした")
-        return nc_files  # 日付情報がなくても、見つかったファイルを返す
+        return [nc_file for nc_file, _ in nc_files]  # 日付情報がなくても、見つかったファイルを返す
     
-    # 日付でソート
+    # 日付でソート（YYYYMMDD形式なので文字列順が日付順になる）
     nc_files_with_date.sort(key=lambda x: x[1])
     return [file for file, _ in nc_files_with_date]
 
-def process_point_file(point, nc_file, region_size, output_dir):
-    """1つの地点と1つのファイルの組み合わせを処理する関数"""
+def get_date_str(nc_file):
+    """ファイル名からYYYYMMDD形式の日付を抽出する関数"""
+    match = DATE_PATTERN.search(os.path.basename(nc_file))
+    return match.group(1) if match else "unknown"
+
+def failed_result(point, date_str, error):
+    """処理に失敗した地点の結果を作成する関数"""
+    return {
+        'point_no': point['No'],
+        'lat': point['Lat'],
+        'lon': point['Lon'],
+        'date': date_str,
+        'success': False,
+        'error': error
+    }
+
+def open_stats_writer(stats_file, write_header=True, mode='a'):
+    """統計情報を1行ずつ追記するCSVファイルを開く関数
+    
+    Args:
+        stats_file (str): CSVファイルのパス
+        write_header (bool): ヘッダー行を書き出すかどうか
+        mode (str): ファイルを開くモード（'w'の場合は既存の内容を消去する）
+    
+    Returns:
+        tuple: (ファイルオブジェクト, csv.DictWriter)
+    """
+    f = open(stats_file, mode, encoding='utf-8', newline='')
+    writer = csv.DictWriter(f, fieldnames=STATS_FIELDS)
+    if write_header:
+        writer.writeheader()
+    return f, writer
+
+def get_dense_block(region_slices):
+    """
+    地点の領域が密集している場合に、全領域を囲む範囲を求める関数
+    
+    地点が多く領域が重なり合う場合は、小さな範囲を何度も読み込むより、
+    囲む範囲を一度だけ読み込んでNDVIを計算し、各地点はその部分配列を使う方が速い。
+    
+    Args:
+        region_slices (list): 各地点の(lat_slice, lon_slice)のリスト
+    
+    Returns:
+        tuple: 囲む範囲の(lat_slice, lon_slice)。地点がまばらな場合はNone
+    """
+    windows = [(lat_slice, lon_slice) for lat_slice, lon_slice in region_slices
+               if lat_slice.start < lat_slice.stop and lon_slice.start < lon_slice.stop]
+    if len(windows) < 2:
+        return None
+    
+    lat_start = min(lat_slice.start for lat_slice, _ in windows)
+    lat_stop = max(lat_slice.stop for lat_slice, _ in windows)
+    lon_start = min(lon_slice.start for _, lon_slice in windows)
+    lon_stop = max(lon_slice.stop for _, lon_slice in windows)
+    
+    block_area = (lat_stop - lat_start) * (lon_stop - lon_start)
+    windows_area = sum((lat_slice.stop - lat_slice.start) * (lon_slice.stop - lon_slice.start)
+                       for lat_slice, lon_slice in windows)
+    if block_area > windows_area * DENSE_READ_RATIO:
+        return None
+    return slice(lat_start, lat_stop), slice(lon_start, lon_stop)
+
+def process_file_all_points(nc_file, points, region_size, stats_writer):
+    """
+    1つの.ncファイルを一度だけ開き、全地点をプロセス内で処理する関数
+    
+    地点ごとの統計情報は個別のファイルにせず、stats_writer（csv.DictWriter）に1行ずつ書き出す。
+    """
+    date_str = get_date_str(nc_file)
+    print(f"処理中: ファイル: {os.path.basename(nc_file)} （{len(points)}地点）")
+    
+    nc_data = None
+    try:
+        nc_data = netcdf_visualizer.open_nc_dataset(nc_file)
+        
+        # 全地点の領域のスライスを座標軸から一括で求める
+        lons, lats = netcdf_visualizer.load_coordinates(nc_data)
+        region_slices = netcdf_visualizer.get_points_region_slices(
+            lats, 
+            lons, 
+            np.fromiter((p['Lat'] for p in points), dtype=np.float64, count=len(points)), 
+            np.fromiter((p['Lon'] for p in points), dtype=np.float64, count=len(points)), 
+            region_size
+        )
+    except Exception as e:
+        # 座標軸の変数がない場合なども、ファイルの読み込みの失敗として全地点を失敗にする
+        if nc_data is not None:
+            nc_data.close()
+        print(f"  エラー: ファイル {os.path.basename(nc_file)} の読み込みに失敗しました: {e!r}")
+        return [failed_result(point, date_str, repr(e)) for point in points]
+    
+    # 各ファイルは1回の実行で一度しか処理しないため、全地点の処理が終わったら閉じる
+    with nc_data:
+        return process_regions(nc_data, nc_file, points, region_slices, region_size, stats_writer)
+
+def process_regions(nc_data, nc_file, points, region_slices, region_size, stats_writer):
+    """
+    開いている.ncファイルから、各地点の領域のNDVI統計情報を計算する関数
+    
+    Args:
+        nc_data: netCDF4.Datasetオブジェクト
+        nc_file (str): .ncファイルのパス（日付の抽出に使う）
+        points (list): 地点情報のリスト
+        region_slices (list): 各地点の(lat_slice, lon_slice)のリスト
+        region_size (float): 抽出する領域のサイズ（km）
+        stats_writer (csv.DictWriter): 統計情報を1行ずつ書き出すライター
+    
+    Returns:
+        list: 地点ごとの処理結果のリスト
+    """
+    date_str = get_date_str(nc_file)
+    stats_date = netcdf_visualizer.extract_date_str(nc_file)
+    results = []
+    rows = []
+    
+    # 地点が密集している場合は、全地点を囲む範囲のNDVIを一度だけ計算する
+    block = get_dense_block(region_slices)
+    if block is not None:
+        try:
+            block_ndvi = netcdf_visualizer.read_ndvi(nc_data, *block)
+        except Exception as e:
+            print(f"  警告: 全地点を囲む範囲の読み込みに失敗したため、地点ごとに読み込みます: {e}")
+            block = None
+    
+    for point, (lat_slice, lon_slice) in zip(points, region_slices):
+        point_no = point['No']
+        lat = point['Lat']
+        lon = point['Lon']
+        
+        # 地点の周辺領域の反射率データだけを読み込んでNDVIを計算する
+        stats = {}
+        if lat_slice.start < lat_slice.stop and lon_slice.start < lon_slice.stop:
+            try:
+                if block is not None:
+                    block_lat, block_lon = block
+                    region_ndvi = block_ndvi[lat_slice.start - block_lat.start:lat_slice.stop - block_lat.start, 
+                                             lon_slice.start - block_lon.start:lon_slice.stop - block_lon.start]
+                else:
+                    region_ndvi = netcdf_visualizer.read_ndvi(nc_data, lat_slice, lon_slice)
+            except Exception as e:
+                print(f"  エラー: 地点 {point_no} の領域の読み込みに失敗しました: {e}")
+                results.append(failed_result(point, date_str, str(e)))
+                continue
+            stats = netcdf_visualizer.region_ndvi_stats(region_ndvi, lat, lon, region_size, stats_date)
+        
+        if not stats:
+            print(f"  警告: 地点 {point_no} (緯度: {lat}, 経度: {lon}) の領域に有効なNDVIデータがありませんでした")
+            results.append(failed_result(point, date_str, '指定された領域に有効なNDVIデータがありませんでした'))
+            continue
+        
+        # 統計情報をまとめ用のCSVファイルの1行とする
+        stats['地点No'] = point_no
+        rows.append(stats)
+        
+        results.append({
+            'point_no': point_no,
+            'lat': lat,
+            'lon': lon,
+            'date': date_str,
+            'stats': stats,
+            'ndvi_mean': stats['平均NDVI'],
+            'success': True
+        })
+    
+    # 全地点の処理が終わってからまとめて書き出す（途中で失敗したファイルの行を残さない）
+    stats_writer.writerows(rows)
+    return results
+
+# ワーカープロセスで共有する設定（init_workerで設定される）
+worker_config = {}
+
+def init_worker(points, region_size, shard_dir):
+    """
+    ワーカープロセスの初期化時に共通設定を受け取る関数
+    
+    統計情報はワーカーごとのCSVファイル（shard_dir/ワーカーのPID.csv）に追記する。
+    ファイルはワーカーの存続中は開いたままにする。
+    """
+    worker_config['points'] = points
+    worker_config['region_size'] = region_size
+    shard_file = os.path.join(shard_dir, f"{os.getpid()}.csv")
+    worker_config['stats_file'], worker_config['stats_writer'] = open_stats_writer(shard_file, write_header=False)
+
+def process_file_in_worker(nc_file):
+    """init_workerで受け取った設定を使って1つの.ncファイルを処理する関数"""
+    try:
+        return process_file_all_points(
+            nc_file, 
+            worker_config['points'], 
+            worker_config['region_size'], 
+            worker_config['stats_writer']
+        )
+    except Exception as e:
+        # 失敗したファイルの地点も集計に含めるため、全地点を失敗として返す
+        print(f"エラー: ファイル {os.path.basename(nc_file)} の処理中に例外が発生しました: {e}")
+        return [failed_result(point, get_date_str(nc_file), str(e)) for point in worker_config['points']]
+    finally:
+        # ワーカーの終了時にファイルが閉じられなくても内容が残るよう、ファイルごとに書き出す
+        worker_config['stats_file'].flush()
+
+def merge_stats_shards(shard_dir, stats_file, points, failed_files=()):
+    """
+    ワーカーごとの統計情報ファイルを1つのCSVファイルにまとめ、一時ディレクトリを削除する関数
+    
+    行は逐次処理と同じく日付順・地点リスト順に並べ替える。
+    ワーカーが異常終了して失敗として扱ったファイルの行は、書き出されていても含めない
+    （同じ日付の別のファイルがある場合は、その日付の行も含まれなくなる）。
+    
+    Args:
+        shard_dir (str): ワーカーごとの統計情報ファイルのディレクトリ
+        stats_file (str): 追記先のCSVファイル（ヘッダーは書き出し済み）
+        points (list): 地点情報のリスト
+        failed_files (list): 失敗として扱った.ncファイルのパスのリスト
+    """
+    point_order = {str(point['No']): i for i, point in enumerate(points)}
+    failed_keys = {(netcdf_visualizer.extract_date_str(nc_file), str(point['No']))
+                   for nc_file in failed_files for point in points}
+    
+    rows = []
+    for entry in os.scandir(shard_dir):
+        with open(entry.path, 'r', encoding='utf-8', newline='') as shard:
+            for row in csv.DictReader(shard, fieldnames=STATS_FIELDS):
+                if (row['日付'], row['地点No']) not in failed_keys:
+                    rows.append(row)
+    rows.sort(key=lambda row: (row['日付'], point_order.get(row['地点No'], len(point_order))))
+    
+    f, writer = open_stats_writer(stats_file, write_header=False)
+    with f:
+        writer.writerows(rows)
+    shutil.rmtree(shard_dir)
+
+def process_point_file_subprocess(point, nc_file, region_size, output_dir, verbose=False):
+    """1つの地点と1つのファイルの組み合わせをnetcdf_visualizer.pyのサブプロセスで処理する関数（従来方式）
+    
+    子プロセスの標準出力は大量になるため、verboseがFalseの場合は破棄する。
+    標準エラー出力は失敗時の表示用にのみ取得する。
+    """
     point_no = point['No']
     lat = point['Lat']
     lon = point['Lon']
     
     # ファイル名から日付を抽出
-    filename = os.path.basename(nc_file)
-    date_str = "unknown"
-    if "_" in filename:
-        parts = filename.split("_")
-        for part in parts:
-            # 空白を削除して処理
-            part = part.strip()
-            if len(part) == 8 and part.isdigit():
-                date_str = part
-                break
+    date_str = get_date_str(nc_file)
     
     print(f"処理中: 地点 {point_no} (緯度: {lat}, 経度: {lon}), ファイル: {os.path.basename(nc_file)}")
     
@@ -150,14 +395,13 @@ def process_point_file(point, nc_file, region_size, output_dir):
     try:
         # サブプロセスとして実行
         print(f"  実行コマンド: {' '.join(cmd)}")
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+        result = subprocess.run(cmd, stdout=subprocess.PIPE if verbose else subprocess.DEVNULL,
+                                stderr=subprocess.PIPE, check=True)
         print(f"  コマンド実行結果: {result.returncode}")
         
-        # 標準出力と標準エラー出力を表示
-        if result.stdout:
-            print(f"  標準出力:\n{result.stdout}")
-        if result.stderr:
-            print(f"  標準エラー出力:\n{result.stderr}")
+        # 詳細表示の場合のみ標準出力を表示
+        if verbose and result.stdout:
+            print(f"  標準出力:\n{result.stdout.decode('utf-8', errors='replace')}")
         
         # 統計情報ファイルのパス（netcdf_visualizer.pyによって生成される）
         stats_file = os.path.splitext(output_image)[0] + "_stats.csv"
@@ -190,12 +434,18 @@ def process_point_file(point, nc_file, region_size, output_dir):
                     pass
             
             print(f"  結果を保存しました: {output_stats}")
+            try:
+                ndvi_mean = float(stats_data.get('平均NDVI', 'NaN'))
+            except (ValueError, TypeError):
+                ndvi_mean = float('nan')
             return {
                 'point_no': point_no,
                 'lat': lat,
                 'lon': lon,
                 'date': date_str,
                 'stats_file': output_stats,
+                'stats': stats_data,
+                'ndvi_mean': ndvi_mean,
                 'success': True
             }
         else:
@@ -210,19 +460,31 @@ def process_point_file(point, nc_file, region_size, output_dir):
             }
     
     except subprocess.CalledProcessError as e:
+        # 標準エラー出力は失敗時のみデコードする
+        stderr = e.stderr.decode('utf-8', errors='replace') if e.stderr else ''
         print(f"  エラー: 地点 {point_no}, ファイル {os.path.basename(nc_file)} の処理に失敗しました")
         print(f"  コマンド: {' '.join(cmd)}")
-        print(f"  エラー出力: {e.stderr}")
+        print(f"  エラー出力: {stderr}")
         return {
             'point_no': point_no,
             'lat': lat,
             'lon': lon,
             'date': date_str,
             'success': False,
-            'error': e.stderr
+            'error': stderr
         }
 
-def create_summary(results, output_dir):
+def write_parquet(df, csv_file):
+    """DataFrameをCSVファイルと同じ名前のParquetファイル（zstd圧縮）にも保存する関数"""
+    parquet_file = os.path.splitext(csv_file)[0] + '.parquet'
+    try:
+        df.to_parquet(parquet_file, index=False, compression='zstd')
+    except ImportError:
+        print("警告: Parquetファイルを作成できませんでした（pyarrowをインストールしてください）")
+        return
+    print(f"Parquetファイルを作成しました: {parquet_file}")
+
+def create_summary(results, output_dir, parquet=False):
     """処理結果をまとめたCSVファイルを作成する関数"""
     # 成功した結果のみ抽出
     successful_results = [r for r in results if r['success']]
@@ -231,50 +493,26 @@ def create_summary(results, output_dir):
         print("警告: 成功した処理結果がありません。サマリーファイルは作成されません。")
         return
     
-    # 各地点ごとの時系列データを作成
-    points_data = {}
-    for result in successful_results:
-        point_no = result['point_no']
-        date = result['date']
-        stats_file = result.get('stats_file')
-        
-        if not stats_file or not os.path.exists(stats_file):
-            continue
-        
-        # 統計情報ファイルを読み込む
-        stats_data = {}
-        with open(stats_file, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                stats_data[row['統計量']] = row['値']
-        
-        # 地点データを初期化
-        if point_no not in points_data:
-            points_data[point_no] = {
-                'No': point_no,
-                'Lat': result['lat'],
-                'Lon': result['lon']
-            }
-        
-        # 日付ごとのNDVI値を追加
-        try:
-            ndvi_value = float(stats_data.get('平均NDVI', 'NaN'))
-            points_data[point_no][date] = ndvi_value
-        except (ValueError, TypeError):
-            points_data[point_no][date] = 'NaN'
-    
-    # DataFrameに変換
-    df = pd.DataFrame.from_dict(points_data, orient='index')
-    
-    # 列の順序を整理（No, Lat, Lon, 日付1, 日付2, ...）
-    date_columns = sorted([col for col in df.columns if col not in ['No', 'Lat', 'Lon']])
-    columns_order = ['No', 'Lat', 'Lon'] + date_columns
-    df = df[columns_order]
+    # 処理結果の平均NDVIから、地点ごとの時系列データを作成
+    # （地点の並びは処理結果に現れた順、列は No, Lat, Lon, 日付1, 日付2, ...）
+    df = pd.DataFrame({
+        'No': [r['point_no'] for r in successful_results],
+        'Lat': [r['lat'] for r in successful_results],
+        'Lon': [r['lon'] for r in successful_results],
+        'Date': [r['date'] for r in successful_results],
+        'NDVI': [r['ndvi_mean'] for r in successful_results]
+    })
+    coords = df.drop_duplicates('No').set_index('No')[['Lat', 'Lon']]
+    ndvi = df.drop_duplicates(['No', 'Date'], keep='last').pivot(index='No', columns='Date', values='NDVI')
+    df = coords.join(ndvi[sorted(ndvi.columns)]).reset_index()
+    df.columns.name = None
     
     # CSVファイルに保存
     summary_file = os.path.join(output_dir, 'ndvi_summary.csv')
     df.to_csv(summary_file, index=False, encoding='utf-8')
     print(f"サマリーファイルを作成しました: {summary_file}")
+    if parquet:
+        write_parquet(df, summary_file)
     
     # 日付ごとのサマリーも作成
     df_by_date = df.melt(id_vars=['No', 'Lat', 'Lon'], 
@@ -285,6 +523,8 @@ def create_summary(results, output_dir):
     date_summary_file = os.path.join(output_dir, 'ndvi_by_date.csv')
     df_by_date.to_csv(date_summary_file, index=False, encoding='utf-8')
     print(f"日付ごとのサマリーファイルを作成しました: {date_summary_file}")
+    if parquet:
+        write_parquet(df_by_date, date_summary_file)
 
 def main():
     """メイン関数"""
@@ -340,44 +580,110 @@ def main():
     print(f"処理を開始します（ワーカー数: {args.workers}）")
     results = []
     
-    # 並列処理
-    if args.workers > 1:
-        print(f"並列処理モード: {args.workers}ワーカー")
-        with concurrent.futures.ProcessPoolExecutor(max_workers=args.workers) as executor:
-            futures = []
-            for point in points:
-                for nc_file in nc_files:
-                    future = executor.submit(
-                        process_point_file, 
-                        point, 
-                        nc_file, 
-                        args.region_size, 
-                        output_dir
-                    )
-                    futures.append(future)
+    # 全地点・全日付の統計情報をまとめるCSVファイル（ヘッダーのみ先に書き出す）
+    if not args.subprocess:
+        stats_file = os.path.join(output_dir, STATS_FILE_NAME)
+        # 前回中断した実行の一時ファイルが残っていても、内容を消去して書き直す
+        f, _ = open_stats_writer(stats_file + '.tmp', mode='w')
+        f.close()
+    
+    try:
+        # 並列処理
+        if args.workers > 1 and not args.subprocess:
+            print(f"並列処理モード: {args.workers}ワーカー")
+            # 統計情報はワーカーごとのファイルに書き出し、全ワーカーの終了後に連結する
+            shard_dir = os.path.join(output_dir, STATS_SHARD_DIR_NAME)
+            shutil.rmtree(shard_dir, ignore_errors=True)
+            os.makedirs(shard_dir)
+            # 地点リストなどの共通設定は各ワーカーの初期化時に1回だけ渡し、
+            # タスクとしては.ncファイルのパスのみを送る
+            failed_files = []
+            try:
+                with concurrent.futures.ProcessPoolExecutor(
+                        max_workers=args.workers,
+                        initializer=init_worker,
+                        initargs=(points, args.region_size, shard_dir)) as executor:
+                    futures = {executor.submit(process_file_in_worker, nc_file): nc_file for nc_file in nc_files}
+                
+                    # 結果の収集（ワーカーが異常終了した場合も、他のファイルの結果は残す）
+                    for future in concurrent.futures.as_completed(futures):
+                        nc_file = futures[future]
+                        try:
+                            results.extend(future.result())
+                        except Exception as e:
+                            print(f"エラー: ファイル {os.path.basename(nc_file)} の処理中に例外が発生しました: {e}")
+                            results.extend(failed_result(point, get_date_str(nc_file), str(e)) for point in points)
+                            failed_files.append(nc_file)
+            finally:
+                # 途中で失敗した場合も、それまでに書き出された統計情報をまとめて一時ディレクトリを削除する
+                merge_stats_shards(shard_dir, stats_file + '.tmp', points, failed_files)
+        elif args.workers > 1:
+            print(f"並列処理モード: {args.workers}ワーカー")
+            with concurrent.futures.ProcessPoolExecutor(max_workers=args.workers) as executor:
+                futures = []
+                for point in points:
+                    for nc_file in nc_files:
+                        future = executor.submit(
+                            process_point_file_subprocess, 
+                            point, 
+                            nc_file, 
+                            args.region_size, 
+                            output_dir,
+                            args.verbose
+                        )
+                        futures.append(future)
             
-            # 結果の収集
-            for future in concurrent.futures.as_completed(futures):
-                try:
-                    result = future.result()
-                    results.append(result)
-                except Exception as e:
-                    print(f"エラー: 処理中に例外が発生しました: {e}")
-    else:
-        print("逐次処理モード")
-        # 逐次処理
-        for point in points:
-            for nc_file in nc_files:
-                try:
-                    result = process_point_file(
-                        point, 
-                        nc_file, 
-                        args.region_size, 
-                        output_dir
-                    )
-                    results.append(result)
-                except Exception as e:
-                    print(f"エラー: 処理中に例外が発生しました: {e}")
+                # 結果の収集
+                for future in concurrent.futures.as_completed(futures):
+                    try:
+                        result = future.result()
+                        results.append(result)
+                    except Exception as e:
+                        print(f"エラー: 処理中に例外が発生しました: {e}")
+        else:
+            print("逐次処理モード")
+            # 逐次処理
+            if args.subprocess:
+                for point in points:
+                    for nc_file in nc_files:
+                        try:
+                            result = process_point_file_subprocess(
+                                point, 
+                                nc_file, 
+                                args.region_size, 
+                                output_dir,
+                                args.verbose
+                            )
+                            results.append(result)
+                        except Exception as e:
+                            print(f"エラー: 処理中に例外が発生しました: {e}")
+            else:
+                f, stats_writer = open_stats_writer(stats_file + '.tmp', write_header=False)
+                with f:
+                    for nc_file in nc_files:
+                        try:
+                            file_results = process_file_all_points(
+                                nc_file, 
+                                points, 
+                                args.region_size, 
+                                stats_writer
+                            )
+                            results.extend(file_results)
+                        except Exception as e:
+                            print(f"エラー: ファイル {os.path.basename(nc_file)} の処理中に例外が発生しました: {e}")
+                            results.extend(failed_result(point, get_date_str(nc_file), str(e)) for point in points)
+    except BaseException:
+        # 中断・失敗した場合は、途中までの一時ファイルを残さない（次回の実行に混入させない）
+        if not args.subprocess:
+            if os.path.exists(stats_file + '.tmp'):
+                os.remove(stats_file + '.tmp')
+            shutil.rmtree(os.path.join(output_dir, STATS_SHARD_DIR_NAME), ignore_errors=True)
+        raise
+    
+    # 書き込みが完了してから統計情報ファイルを置き換える
+    if not args.subprocess:
+        os.replace(stats_file + '.tmp', stats_file)
+        print(f"統計情報ファイルを作成しました: {stats_file}")
     
     print(f"処理が完了しました。合計: {len(results)}件")
     
@@ -390,7 +696,7 @@ def main():
     # サマリーファイルの作成
     if args.summary:
         print("サマリーファイルを作成中...")
-        create_summary(results, output_dir)
+        create_summary(results, output_dir, args.parquet)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
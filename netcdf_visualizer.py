@@ -8,15 +8,48 @@ import argparse
 import os
 from matplotlib.patches import Rectangle
 import csv
-import datetime
 import sys
+import math
+import concurrent.futures
 import matplotlib as mpl
+import matplotlib.font_manager as fm
+
+# NDVIの計算に使う反射率データの変数ごとに確保するHDF5チャンクキャッシュの上限（バイト）
+CHUNK_CACHE_MAX_SIZE = 128 * 1024 * 1024
+
+# 日本語フォントの設定が済んでいるかどうか（プロセス内で一度だけ設定する）
+font_setup_done = False
+
+def find_font_family(families):
+    """
+    インストールされているフォントファミリーを探す関数
+    
+    Args:
+        families (list): 候補のフォントファミリー名のリスト（優先順）
+    
+    Returns:
+        str: 最初に見つかったフォントファミリー名（見つからない場合はNone）
+    """
+    for family in families:
+        try:
+            fm.findfont(fm.FontProperties(family=family), fallback_to_default=False)
+            return family
+        except ValueError:
+            continue
+    return None
 
 # 日本語フォント設定
 def setup_japanese_font():
     """
     matplotlibで日本語フォントを使用するための設定を行う関数
+    
+    フォントの検索は時間がかかるため、2回目以降の呼び出しでは何もしない。
     """
+    global font_setup_done
+    if font_setup_done:
+        return
+    font_setup_done = True
+    
     # macOSの場合
     if sys.platform.startswith('darwin'):
         font_dirs = ['/System/Library/Fonts', '/Library/Fonts', os.path.expanduser('~/Library/Fonts')]
@@ -61,102 +94,466 @@ def setup_japanese_font():
         else:
             print("警告: 日本語フォントが見つかりませんでした。テキストが正しく表示されない可能性があります。")
     
-    # Linuxの場合
-    elif sys.platform.startswith('linux'):
-        try:
-            # IPAフォントがインストールされているか確認
-            plt.rcParams['font.family'] = 'IPAPGothic'
-            print("日本語フォントを設定しました: IPAPGothic")
-        except Exception:
-            try:
-                # Notoフォントを試す
-                plt.rcParams['font.family'] = 'Noto Sans CJK JP'
-                print("日本語フォントを設定しました: Noto Sans CJK JP")
-            except Exception:
-                print("警告: 日本語フォントが見つかりませんでした。テキストが正しく表示されない可能性があります。")
-    
-    # Windowsの場合
-    elif sys.platform.startswith('win'):
-        try:
-            plt.rcParams['font.family'] = 'MS Gothic'
-            print("日本語フォントを設定しました: MS Gothic")
-        except Exception:
+    # Linux・Windowsの場合
+    # （rcParamsへの代入は存在しないフォントでも失敗しないため、実際にフォントを探して確認する）
+    elif sys.platform.startswith('linux') or sys.platform.startswith('win'):
+        if sys.platform.startswith('linux'):
+            # IPAフォント、Notoフォントの順に試す
+            family = find_font_family(['IPAPGothic', 'Noto Sans CJK JP'])
+        else:
+            family = find_font_family(['MS Gothic'])
+        
+        if family:
+            plt.rcParams['font.family'] = family
+            print(f"日本語フォントを設定しました: {family}")
+        else:
             print("警告: 日本語フォントが見つかりませんでした。テキストが正しく表示されない可能性があります。")
-    
-    # フォントキャッシュをクリア
-    try:
-        import matplotlib.font_manager as fm
-        fm._rebuild()
-    except Exception:
-        # 新しいバージョンのmatplotlibでは_rebuild()が非推奨または引数が必要な場合がある
-        try:
-            fm.fontManager.findfont('DejaVu Sans')  # キャッシュを再構築するためのダミー呼び出し
-            print("フォントキャッシュを更新しました")
-        except Exception:
-            print("警告: フォントキャッシュの更新に失敗しました")
 
-def haversine_distance(lat1, lon1, lat2, lon2):
+def haversine_distance(lat1, lon1, lat2, lon2, radians=False):
     """
     2点間の距離をhaversine公式で計算する関数（単位: km）
     
+    すべての引数がPythonの数値（またはnp.float64）の場合は、NumPyの配列演算ではなくmathモジュールで計算する
+    （0次元配列や一時配列を作らないため、1点ずつの計算ではこちらの方が速い）。
+    配列の場合は、途中の計算結果をout=で同じ配列に書き込み、一時配列の数を抑える
+    （マスク配列の場合はマスクを保つため、通常の配列演算で計算する）。
+    同じ座標軸に対して繰り返し呼び出す場合は、事前にnp.radiansで変換した配列を
+    radians=Trueで渡すと、呼び出しごとの変換を省略できる。
+    
     Args:
         lat1, lon1: 地点1の緯度・経度（度）
         lat2, lon2: 地点2の緯度・経度（度）
+        radians (bool): 緯度・経度をラジアンで渡す場合はTrue
     
     Returns:
-        float: 2点間の距離（km）
+        float または numpy.ndarray: 2点間の距離（km）
     """
     # 地球の半径（km）
     R = 6371.0
     
-    # 度からラジアンに変換
-    lat1_rad = np.radians(lat1)
-    lon1_rad = np.radians(lon1)
-    lat2_rad = np.radians(lat2)
-    lon2_rad = np.radians(lon2)
+    # np.float32などはmathで計算すると精度が変わるため、NumPyの演算で計算する
+    if all(isinstance(v, (int, float)) for v in (lat1, lon1, lat2, lon2)):
+        if not radians:
+            lat1, lon1, lat2, lon2 = (math.radians(v) for v in (lat1, lon1, lat2, lon2))
+        dlat = lat2 - lat1
+        dlon = lon2 - lon1
+        a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
+        return R * 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
     
-    # 緯度と経度の差分
-    dlat = lat2_rad - lat1_rad
-    dlon = lon2_rad - lon1_rad
+    # 度からラジアンに変換
+    if not radians:
+        lat1, lon1, lat2, lon2 = (np.radians(v) for v in (lat1, lon1, lat2, lon2))
+    
+    if any(isinstance(v, np.ma.MaskedArray) for v in (lat1, lon1, lat2, lon2)):
+        dlat = lat2 - lat1
+        dlon = lon2 - lon1
+        a = np.sin(dlat/2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon/2)**2
+        return R * (2 * np.arctan2(np.sqrt(a), np.sqrt(1-a)))
+    
+    # 緯度と経度の差分から sin(d/2)^2 を求める（差分の配列をそのまま使い回す）
+    # 片方の地点がスカラーや0次元配列の場合、NumPyの演算結果はスカラーになり、out=に渡せないため
+    # np.asarrayで必ず配列（0次元を含む）にしてから書き込む
+    dtype = np.result_type(lat1, lat2, lon1, lon2, 1.0)
+    half_dlat = np.asarray(np.subtract(lat2, lat1, dtype=dtype))
+    half_dlat *= 0.5
+    np.square(np.sin(half_dlat, out=half_dlat), out=half_dlat)
+    half_dlon = np.asarray(np.subtract(lon2, lon1, dtype=dtype))
+    half_dlon *= 0.5
+    np.square(np.sin(half_dlon, out=half_dlon), out=half_dlon)
     
     # haversine公式
-    a = np.sin(dlat/2)**2 + np.cos(lat1_rad) * np.cos(lat2_rad) * np.sin(dlon/2)**2
-    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1-a))
-    distance = R * c
-    
-    return distance
+    a = np.asarray(half_dlat + np.cos(lat1) * np.cos(lat2) * half_dlon)
+    b = np.asarray(np.subtract(1, a))
+    np.sqrt(a, out=a)
+    np.sqrt(b, out=b)
+    np.arctan2(a, b, out=a)
+    a *= 2 * R
+    
+    # 0次元の場合は、従来通りNumPyのスカラーとして返す
+    return a[()] if a.ndim == 0 else a
 
 def get_region_indices(lats, lons, center_lat, center_lon, region_size_km):
     """
     指定された中心点から特定の距離（km）内の領域のインデックスを取得する関数
     
     Args:
-        lats: 緯度の配列
-        lons: 経度の配列
+        lats: 緯度の配列（昇順または降順）
+        lons: 経度の配列（昇順または降順）
         center_lat: 中心点の緯度
         center_lon: 中心点の経度
         region_size_km: 領域のサイズ（km）
     
     Returns:
-        tuple: (lat_indices, lon_indices) - 条件を満たすインデックスの配列
+        tuple: (lat_slice, lon_slice) - 条件を満たす範囲のスライス
+        （軸は単調なので範囲は連続しており、配列の基本スライスでコピーせずに取り出せる）
+    """
+    # 緯度・経度の軸は単調なので、全体を比較せずに二分探索で範囲の両端を求める
+    (lat_slice, lon_slice), = get_points_region_slices(lats, lons, [center_lat], [center_lon], region_size_km)
+    
+    return lat_slice, lon_slice
+
+def open_nc_dataset(nc_file_path):
+    """
+    NetCDFファイルを開き、反射率データのチャンクキャッシュを設定する関数
+    
+    HDF5のチャンクキャッシュは既定では変数ごとに1MiBしかなく、同じチャンクに
+    何度もアクセスすると（近い地点の領域を続けて読み込む場合など）そのたびに展開し直すことになる。
+    そのため、SREFL_CH1/SREFL_CH2は変数全体のチャンクが収まる大きさ
+    （CHUNK_CACHE_MAX_SIZEまで）のキャッシュを設定する。
+    
+    Args:
+        nc_file_path (str): NetCDFファイルのパス
+    
+    Returns:
+        netCDF4.Dataset: 開いたデータセット
+    """
+    nc_data = Dataset(nc_file_path, 'r')
+    try:
+        for name in ('SREFL_CH1', 'SREFL_CH2'):
+            var = nc_data.variables[name]
+            chunking = var.chunking()
+            if chunking == 'contiguous':
+                continue
+            # 変数全体を覆うチャンク数と、そのチャンクがすべて収まるキャッシュサイズ
+            n_chunks = int(np.prod([-(-dim // chunk) for dim, chunk in zip(var.shape, chunking)]))
+            cache_size = min(n_chunks * int(np.prod(chunking)) * var.dtype.itemsize, CHUNK_CACHE_MAX_SIZE)
+            var.set_var_chunk_cache(size=cache_size, nelems=max(n_chunks * 10, 521), preemption=0.75)
+    except Exception:
+        # 反射率データの変数がない場合などは、開いたファイルを閉じてから例外を伝える
+        nc_data.close()
+        raise
+    return nc_data
+
+def extract_date_str(nc_file_path):
+    """
+    NetCDFファイル名から日付を抽出する関数（ファイル名のフォーマットに依存）
+    
+    Args:
+        nc_file_path (str): NetCDFファイルのパス
+    
+    Returns:
+        str: 「YYYY年MM月DD日」形式の日付（抽出できない場合は「不明」）
+    """
+    filename = os.path.basename(nc_file_path)
+    if "_" in filename:
+        parts = filename.split("_")
+        for part in parts:
+            if len(part) == 8 and part.isdigit():
+                return f"{part[:4]}年{part[4:6]}月{part[6:8]}日"
+    return "不明"
+
+def load_coordinates(nc_data, lat_slice=slice(None), lon_slice=slice(None)):
+    """
+    開いているNetCDFデータセットから緯度・経度を読み込む関数
+    
+    Args:
+        nc_data: netCDF4.Datasetオブジェクト
+        lat_slice (slice): 読み込む緯度方向の範囲（デフォルトは全体）
+        lon_slice (slice): 読み込む経度方向の範囲（デフォルトは全体）
+    
+    Returns:
+        tuple: (lons, lats) - 経度の配列、緯度の配列
+    """
+    lons = nc_data.variables['longitude'][lon_slice]
+    lats = nc_data.variables['latitude'][lat_slice]
+    return lons, lats
+
+def variable_attributes(var):
+    """
+    変数の属性をまとめて辞書として取得する関数
+    
+    属性ごとにhasattrやgetncattrでnetCDFライブラリを呼び出さず、一度だけ列挙して取得する。
+    
+    Args:
+        var: netCDF4.Variableオブジェクト
+    
+    Returns:
+        dict: 属性名と値の辞書
+    """
+    return {attr: var.getncattr(attr) for attr in var.ncattrs()}
+
+def read_reflectance(var, lat_slice=slice(None), lon_slice=slice(None)):
+    """
+    表面反射率の変数を読み込み、無効値のマスクとスケール変換を行う関数
+    
+    無効値のマスクはnetCDF4の自動マスクに任せ、自動スケール変換だけを無効にする。
+    格納されている整数値をfloat32に変換してから、その場でスケールファクターとオフセットを適用する
+    （自動変換では倍精度の配列が作られるうえ、属性を見て改めてスケールを掛けると二重に適用されてしまうため）。
+    NDVIの精度にはfloat32で十分なため、メモリ帯域を抑えるためにfloat32で計算する。
+    自動スケール変換の設定は読み込み後に元に戻すため、呼び出し元の変数の設定は変わらない。
+    
+    Args:
+        var: netCDF4.Variableオブジェクト（time, latitude, longitudeの3次元）
+        lat_slice (slice): 読み込む緯度方向の範囲（デフォルトは全体）
+        lon_slice (slice): 読み込む経度方向の範囲（デフォルトは全体）
+    
+    Returns:
+        numpy.ma.MaskedArray: 反射率（float32、無効値はマスク）
+    """
+    auto_scale = var.scale
+    var.set_auto_scale(False)
+    try:
+        raw = var[0, lat_slice, lon_slice]
+    finally:
+        var.set_auto_scale(auto_scale)
+    
+    srefl = np.ma.getdata(raw).astype(np.float32)
+    
+    # スケールファクターとオフセットの適用（必要に応じて）
+    # 読み込んだ配列は他で参照されないため、新しい配列を作らずにその場で変換する
+    attrs = variable_attributes(var)
+    if 'scale_factor' in attrs:
+        np.multiply(srefl, np.float32(attrs['scale_factor']), out=srefl)
+    if 'add_offset' in attrs:
+        np.add(srefl, np.float32(attrs['add_offset']), out=srefl)
+    
+    return np.ma.masked_array(srefl, mask=np.ma.getmaskarray(raw))
+
+def load_ndvi(nc_data, lat_slice=slice(None), lon_slice=slice(None)):
+    """
+    開いているNetCDFデータセットから緯度・経度とNDVIを読み込む関数
+    
+    スライスを指定すると、その範囲の反射率データだけをファイルから読み込む
+    （圧縮されたファイルでも、範囲外のチャンクは展開されない）。
+    
+    Args:
+        nc_data: netCDF4.Datasetオブジェクト
+        lat_slice (slice): 読み込む緯度方向の範囲（デフォルトは全体）
+        lon_slice (slice): 読み込む経度方向の範囲（デフォルトは全体）
+    
+    Returns:
+        tuple: (lons, lats, ndvi) - 経度の配列、緯度の配列、NDVIのマスク配列
+    """
+    lons, lats = load_coordinates(nc_data, lat_slice, lon_slice)
+    return lons, lats, read_ndvi(nc_data, lat_slice, lon_slice)
+
+def read_ndvi(nc_data, lat_slice=slice(None), lon_slice=slice(None)):
+    """
+    開いているNetCDFデータセットからNDVIだけを読み込む関数
+    
+    座標軸を読み込み済みで、領域のスライスが分かっている場合に使う
+    （領域ごとに緯度・経度の変数を読み直さない）。
+    
+    Args:
+        nc_data: netCDF4.Datasetオブジェクト
+        lat_slice (slice): 読み込む緯度方向の範囲（デフォルトは全体）
+        lon_slice (slice): 読み込む経度方向の範囲（デフォルトは全体）
+    
+    Returns:
+        numpy.ma.MaskedArray: NDVIのマスク配列
+    """
+    # 表面反射率データの取得（チャンネル1: 可視光、チャンネル2: 近赤外）
+    srefl_ch1 = read_reflectance(nc_data.variables['SREFL_CH1'], lat_slice, lon_slice)
+    srefl_ch2 = read_reflectance(nc_data.variables['SREFL_CH2'], lat_slice, lon_slice)
+
+    # NDVI（正規化植生指数）の計算
+    # NDVI = (NIR - RED) / (NIR + RED)
+    # マスク配列どうしの演算は値とマスクの両方に一時配列を作るため、値の配列に対して直接計算する。
+    # 読み込んだ配列は他で参照されないので、差はNIRの配列に、NDVIは分母の配列にその場で書き込む。
+    # 分母がゼロのピクセルはwhereで除算の対象外にする（分母の配列なので値は0のまま残る）
+    red = np.ma.getdata(srefl_ch1)
+    nir = np.ma.getdata(srefl_ch2)
+    ndvi = np.add(nir, red)
+    np.subtract(nir, red, out=nir)
+    np.divide(nir, ndvi, out=ndvi, where=ndvi != 0)
+
+    # NDVIの範囲は通常-1から1だが、データによっては調整が必要
+    np.clip(ndvi, -1, 1, out=ndvi)
+
+    # 無効値のマスクは、どちらかのチャンネルが無効値のピクセルとする
+    return np.ma.masked_array(ndvi, mask=np.ma.getmaskarray(srefl_ch1) | np.ma.getmaskarray(srefl_ch2))
+
+def summarize_ndvi(valid_ndvi, total_pixels):
+    """
+    有効なNDVI値から統計量を計算する関数
+    
+    Args:
+        valid_ndvi: 有効なNDVI値の配列（np.ma.compressedでマスクされた値を除いたもの）
+        total_pixels (int): 対象領域の総ピクセル数
+    
+    Returns:
+        dict: 平均・最大・最小・中央値・標準偏差・ピクセル数・有効データ率
+    """
+    values = np.ravel(valid_ndvi)
+    n = values.size
+    
+    # 平均と標準偏差は、NDVIがfloat32でも倍精度で集計する
+    mean = float(np.mean(values, dtype=np.float64))
+    std = float(np.std(values, dtype=np.float64))
+    
+    # 最小・最大・中央値は、1回の部分ソートでそれぞれの位置の値を確定させて求める
+    # （min・max・medianを別々に呼ぶと、そのたびに配列全体を読み直すことになる）
+    middle = [n // 2 - 1, n // 2] if n % 2 == 0 else [n // 2]
+    partitioned = np.partition(values, sorted({0, n - 1, *middle}))
+    
+    return {
+        "平均NDVI": mean,
+        "最大NDVI": float(partitioned[n - 1]),
+        "最小NDVI": float(partitioned[0]),
+        "中央値NDVI": float(np.mean(partitioned[middle])),
+        "標準偏差": std,
+        "有効ピクセル数": int(n),
+        "総ピクセル数": int(total_pixels),
+        "有効データ率(%)": float(n / total_pixels * 100)
+    }
+
+def get_points_region_slices(lats, lons, center_lats, center_lons, region_size_km):
+    """
+    複数の中心点について、特定の距離（km）内の領域のスライスを一括で取得する関数
+    
+    緯度・経度の軸は単調なので、全地点の範囲の端を1回のnp.searchsortedでまとめて求める。
+    領域の判定はget_region_indicesと同じ（範囲の両端を含む）。
+    
+    Args:
+        lats: 緯度の配列（昇順または降順）
+        lons: 経度の配列（昇順または降順）
+        center_lats: 中心点の緯度の配列
+        center_lons: 中心点の経度の配列
+        region_size_km: 領域のサイズ（km）
+    
+    Returns:
+        list: 地点ごとの (lat_slice, lon_slice) のリスト（領域が見つからない場合は空のスライス）
     """
+    center_lats = np.asarray(center_lats, dtype=np.float64)
+    center_lons = np.asarray(center_lons, dtype=np.float64)
+    
     # 半径（km）
     radius = region_size_km / 2
     
     # 緯度1度あたりの距離は約111km
     # 経度1度あたりの距離は緯度によって異なる（赤道で約111km、極で0km）
     lat_range = radius / 111.0
-    lon_range = radius / (111.0 * np.cos(np.radians(center_lat)))
+    lon_range = radius / (111.0 * np.cos(np.radians(center_lats)))
+    
+    def search(axis, vmin, vmax):
+        # 倍精度で比較し（マスク配列どうしの比較と同じ）、両端を含む範囲 [lo, hi) を求める
+        axis = np.ma.getdata(axis).astype(np.float64, copy=False)
+        if axis.size > 1 and axis[0] > axis[-1]:
+            # 降順の軸は反転して探索し、元のインデックスに戻す
+            ascending = axis[::-1]
+            lo = axis.size - np.searchsorted(ascending, vmax, side='right')
+            hi = axis.size - np.searchsorted(ascending, vmin, side='left')
+        else:
+            lo = np.searchsorted(axis, vmin, side='left')
+            hi = np.searchsorted(axis, vmax, side='right')
+        return lo, hi
+    
+    lat_lo, lat_hi = search(lats, center_lats - lat_range, center_lats + lat_range)
+    lon_lo, lon_hi = search(lons, center_lons - lon_range, center_lons + lon_range)
+    
+    return [(slice(int(a), int(b)), slice(int(c), int(d)))
+            for a, b, c, d in zip(lat_lo, lat_hi, lon_lo, lon_hi)]
+
+def region_ndvi_stats(region_ndvi, center_lat, center_lon, region_size_km, date_str):
+    """
+    抽出済みの領域のNDVIから統計情報を計算する関数
+    
+    Args:
+        region_ndvi: 領域のNDVIのマスク配列
+        center_lat (float): 抽出する領域の中心緯度
+        center_lon (float): 抽出する領域の中心経度
+        region_size_km (float): 抽出する領域のサイズ（km）
+        date_str (str): 統計情報に記録する日付
+    
+    Returns:
+        dict: NDVI統計情報（領域が空、または有効なピクセルがない場合は空の辞書）
+    """
+    if region_ndvi.size == 0:
+        return {}
+    
+    valid_ndvi = np.ma.compressed(region_ndvi)
+    if len(valid_ndvi) == 0:
+        return {}
+    
+    return {
+        "対象地域": f"緯度{center_lat:.4f}°N, 経度{center_lon:.4f}°E 周辺 {region_size_km}km四方",
+        "中心緯度": center_lat,
+        "中心経度": center_lon,
+        "メッシュサイズ(km)": region_size_km,
+        "日付": date_str,
+        **summarize_ndvi(valid_ndvi, region_ndvi.size)
+    }
+
+def is_regular_axis(axis):
+    """
+    座標軸が等間隔かどうかを判定する関数
+    
+    Args:
+        axis (numpy.ndarray): 1次元の座標軸
+    
+    Returns:
+        bool: 2点以上あり、間隔がほぼ一定（間隔の0.1%以内）の場合はTrue
+    """
+    if axis.size < 2:
+        return False
+    steps = np.diff(axis)
+    return bool(np.allclose(steps, steps[0], rtol=1e-3, atol=0))
+
+def draw_ndvi_map(lons, lats, ndvi, cmap, norm):
+    """
+    NDVIのマップを現在の図に描画する関数
+    
+    等間隔の緯度経度グリッドの場合は、セルごとの四角形を作るpcolormeshではなく、
+    1枚の画像として描画するimshowを使う（大きなグリッドでは描画と保存が大幅に速い）。
+    等間隔でないグリッドの場合はpcolormeshで描画する。
+    
+    Args:
+        lons (numpy.ndarray): 経度の配列（各セルの中心）
+        lats (numpy.ndarray): 緯度の配列（各セルの中心）
+        ndvi: NDVIのマスク配列
+        cmap: カラーマップ
+        norm: 値の正規化
     
-    # 緯度・経度の範囲
-    lat_min, lat_max = center_lat - lat_range, center_lat + lat_range
-    lon_min, lon_max = center_lon - lon_range, center_lon + lon_range
+    Returns:
+        描画オブジェクト（AxesImageまたはQuadMesh）
+    """
+    lons = np.ma.getdata(lons)
+    lats = np.ma.getdata(lats)
+    if not (is_regular_axis(lons) and is_regular_axis(lats) and lons[0] < lons[-1]):
+        # PDFやSVGに保存する場合も、セルごとの四角形ではなく画像として埋め込む
+        return plt.pcolormesh(lons, lats, ndvi, cmap=cmap, norm=norm, rasterized=True)
+    
+    # pcolormeshと同じく、座標をセルの中心として半セル分外側までを画像の範囲にする
+    half_lon = (lons[1] - lons[0]) / 2
+    half_lat = abs(lats[1] - lats[0]) / 2
+    extent = [lons[0] - half_lon, lons[-1] + half_lon, 
+              min(lats[0], lats[-1]) - half_lat, max(lats[0], lats[-1]) + half_lat]
+    # 緯度が北から南へ並んでいる場合は、1行目を画像の上端にする
+    origin = 'lower' if lats[0] < lats[-1] else 'upper'
+    return plt.imshow(ndvi, cmap=cmap, norm=norm, extent=extent, origin=origin, 
+                      interpolation='nearest', aspect='auto')
+
+def save_ndvi_raster(lons, lats, ndvi, output_file, cmap, norm):
+    """
+    NDVIを1セル1画素の画像として保存する関数
     
-    # インデックスの取得
-    lat_indices = np.where((lats >= lat_min) & (lats <= lat_max))[0]
-    lon_indices = np.where((lons >= lon_min) & (lons <= lon_max))[0]
+    軸や凡例を含む図をsavefigで描画するのではなく、色を付けた配列をそのまま画像として書き出す。
+    北が上、西が左になるように並べ替える（無効値は透明になる）。
     
-    return lat_indices, lon_indices
+    Args:
+        lons (numpy.ndarray): 経度の配列
+        lats (numpy.ndarray): 緯度の配列
+        ndvi: NDVIのマスク配列
+        output_file (str): 出力画像ファイルのパス
+        cmap: カラーマップ
+        norm: 値の正規化
+    """
+    if lons.size > 1 and lons[0] > lons[-1]:
+        ndvi = ndvi[:, ::-1]
+    origin = 'lower' if lats.size > 1 and lats[0] < lats[-1] else 'upper'
+    
+    # カラーマップの全色（と無効値用の透明色）の色表を一度だけ作り、
+    # 各画素の色番号から1回のnp.takeで色を引く（matplotlibが画素ごとに正規化・色変換するより速い）
+    lut = np.vstack([cmap(np.arange(cmap.N), bytes=True), 
+                     np.round(np.array(colors.to_rgba(cmap.get_bad())) * 255).astype(np.uint8)])
+    
+    # matplotlibと同じく、正規化した値を色数倍して切り捨てた位置の色を使う
+    scaled = (np.ma.getdata(ndvi).astype(np.float32) - norm.vmin) * np.float32(cmap.N / (norm.vmax - norm.vmin))
+    np.clip(scaled, 0, cmap.N - 1, out=scaled)
+    index = scaled.astype(np.intp)
+    index[np.ma.getmaskarray(ndvi)] = cmap.N
+    
+    plt.imsave(output_file, np.take(lut, index, axis=0), origin=origin)
 
 def save_ndvi_stats(stats, output_file):
     """
@@ -166,7 +563,7 @@ def save_ndvi_stats(stats, output_file):
         stats: 統計情報の辞書
         output_file: 出力ファイルパス
     """
-    with open(output_file, 'w', newline='') as csvfile:
+    with open(output_file, 'w', encoding='utf-8', newline='') as csvfile:
         fieldnames = ['統計量', '値']
         writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
         
@@ -176,7 +573,7 @@ def save_ndvi_stats(stats, output_file):
     
     print(f"NDVI統計情報をCSVファイルに保存しました: {output_file}")
 
-def visualize_ndvi(nc_file_path, output_file=None, show_plot=True, center_lat=None, center_lon=None, region_size_km=20, ndvi_stats=False):
+def visualize_ndvi(nc_file_path, output_file=None, show_plot=True, center_lat=None, center_lon=None, region_size_km=20, ndvi_stats=False, raster=False, verbose=False):
     """
     NetCDFファイルから植生指数（NDVI）を計算して可視化する関数
     
@@ -184,10 +581,14 @@ def visualize_ndvi(nc_file_path, output_file=None, show_plot=True, center_lat=No
         nc_file_path (str): NetCDFファイルのパス
         output_file (str, optional): 出力画像ファイルのパス
         show_plot (bool): プロットを表示するかどうか
+            （output_fileも指定しない場合は図を作らず、統計情報だけを計算する）
         center_lat (float, optional): 抽出する領域の中心緯度
         center_lon (float, optional): 抽出する領域の中心経度
         region_size_km (float): 抽出する領域のサイズ（km）
         ndvi_stats (bool): NDVI統計情報を出力するかどうか
+        raster (bool): 全体マップの場合、図ではなくNDVIの画像（1セル1画素）として保存するかどうか
+            （show_plotがFalseの場合は図を作らない）
+        verbose (bool): 反射率データの変数の属性を表示するかどうか
     
     Returns:
         dict: NDVI統計情報（ndvi_stats=Trueの場合）
@@ -197,243 +598,249 @@ def visualize_ndvi(nc_file_path, output_file=None, show_plot=True, center_lat=No
     
     # NetCDFファイルの読み込み
     print(f"ファイルを読み込み中: {nc_file_path}")
-    nc_data = Dataset(nc_file_path, 'r')
-
-    # 変数の取得
-    lons = nc_data.variables['longitude'][:]
-    lats = nc_data.variables['latitude'][:]
-
-    # 表面反射率データの取得（チャンネル1と2）
-    srefl_ch1 = nc_data.variables['SREFL_CH1'][0, :, :]  # 可視光
-    srefl_ch2 = nc_data.variables['SREFL_CH2'][0, :, :]  # 近赤外
-
-    # スケールファクターの確認（必要に応じて）
-    print("SREFL_CH1の属性:")
-    for attr in nc_data.variables['SREFL_CH1'].ncattrs():
-        print(f"- {attr}: {nc_data.variables['SREFL_CH1'].getncattr(attr)}")
-
-    print("\nSREFL_CH2の属性:")
-    for attr in nc_data.variables['SREFL_CH2'].ncattrs():
-        print(f"- {attr}: {nc_data.variables['SREFL_CH2'].getncattr(attr)}")
-
-    # 無効値のマスク処理
-    # 一般的に-9999や-32768などの値が無効値として使われることが多い
-    # 属性から正確な無効値を取得
-    if hasattr(nc_data.variables['SREFL_CH1'], '_FillValue'):
-        fill_value = nc_data.variables['SREFL_CH1']._FillValue
-        srefl_ch1 = np.ma.masked_equal(srefl_ch1, fill_value)
-        srefl_ch2 = np.ma.masked_equal(srefl_ch2, fill_value)
-
-    # スケールファクターとオフセットの適用（必要に応じて）
-    if hasattr(nc_data.variables['SREFL_CH1'], 'scale_factor'):
-        scale_factor_ch1 = nc_data.variables['SREFL_CH1'].scale_factor
-        offset_ch1 = nc_data.variables['SREFL_CH1'].add_offset if hasattr(nc_data.variables['SREFL_CH1'], 'add_offset') else 0
-        
-        scale_factor_ch2 = nc_data.variables['SREFL_CH2'].scale_factor
-        offset_ch2 = nc_data.variables['SREFL_CH2'].add_offset if hasattr(nc_data.variables['SREFL_CH2'], 'add_offset') else 0
-        
-        srefl_ch1 = srefl_ch1 * scale_factor_ch1 + offset_ch1
-        srefl_ch2 = srefl_ch2 * scale_factor_ch2 + offset_ch2
-
-    # NDVI（正規化植生指数）の計算
-    # NDVI = (NIR - RED) / (NIR + RED)
-    # ゼロ除算を避けるためのマスク処理
-    denominator = srefl_ch2 + srefl_ch1
-    ndvi = np.zeros_like(denominator)
-    valid_idx = denominator != 0
-    ndvi[valid_idx] = (srefl_ch2[valid_idx] - srefl_ch1[valid_idx]) / denominator[valid_idx]
+    nc_data = open_nc_dataset(nc_file_path)
+    try:
+        # スケールファクターの確認（必要に応じて）
+        if verbose:
+            for var_name in ['SREFL_CH1', 'SREFL_CH2']:
+                print(f"\n{var_name}の属性:")
+                for attr, value in variable_attributes(nc_data.variables[var_name]).items():
+                    print(f"- {attr}: {value}")
 
-    # NDVIの範囲は通常-1から1だが、データによっては調整が必要
-    ndvi = np.clip(ndvi, -1, 1)
+        # 図を保存も表示もしない場合（統計情報だけが必要な場合）は、図を作らない
+        # （全体のNDVIも読み込まず、領域の範囲の反射率データだけを読み込む）
+        # 全体マップをNDVIの画像（1セル1画素）として保存する場合も、表示しなければ図は作らない
+        save_raster = bool(output_file) and raster and (center_lat is None or center_lon is None)
+        make_plot = (bool(output_file) and not save_raster) or show_plot
 
-    # カラーマップの設定（植生表示に適したもの）
-    cmap = plt.cm.RdYlGn  # 赤-黄-緑のカラーマップ（植生によく使われる）
-    norm = colors.Normalize(vmin=-1, vmax=1)
+        # 緯度・経度とNDVIの取得
+        if make_plot or save_raster:
+            lons, lats, ndvi = load_ndvi(nc_data)
+        else:
+            lons, lats = load_coordinates(nc_data)
+            ndvi = None
 
-    # 図の作成
-    plt.figure(figsize=(12, 8))
+        # ファイル名から日付を抽出（ファイル名のフォーマットに依存）
+        date_str = extract_date_str(nc_file_path)
 
-    # ファイル名から日付を抽出（ファイル名のフォーマットに依存）
-    filename = os.path.basename(nc_file_path)
-    date_str = "不明"
-    date_obj = None
-    if "_" in filename:
-        parts = filename.split("_")
-        for part in parts:
-            if len(part) == 8 and part.isdigit():
-                year = part[:4]
-                month = part[4:6]
-                day = part[6:8]
-                date_str = f"{year}年{month}月{day}日"
-                try:
-                    date_obj = datetime.datetime(int(year), int(month), int(day))
-                except ValueError:
-                    pass
-                break
-
-    # 統計情報を格納する辞書
-    stats = {}
-    
-    # 特定の領域を抽出する場合
-    if center_lat is not None and center_lon is not None:
-        # 指定された中心点から特定の距離内の領域を抽出
-        lat_indices, lon_indices = get_region_indices(lats, lons, center_lat, center_lon, region_size_km)
+        # 統計情報を格納する辞書
+        stats = {}
+    
+        # 特定の領域を抽出する場合、指定された中心点から特定の距離内の領域を求める
+        region_found = False
+        if center_lat is not None and center_lon is not None:
+            lat_slice, lon_slice = get_region_indices(lats, lons, center_lat, center_lon, region_size_km)
+            region_found = lat_slice.start < lat_slice.stop and lon_slice.start < lon_slice.stop
+            if not region_found:
+                print(f"警告: 指定された中心点（緯度: {center_lat}, 経度: {center_lon}）から{region_size_km}km四方の領域が見つかりませんでした。")
+                print("全体マップを表示します。")
+    
+        if region_found:
+            if ndvi is not None:
+                # 全体マップは読み込み済みなので、抽出領域は基本スライスでコピーせずに取り出す
+                # （領域の配列は参照のみで、書き換えないこと）
+                region_ndvi = ndvi[lat_slice, lon_slice]
+            else:
+                region_ndvi = read_ndvi(nc_data, lat_slice, lon_slice)
         
-        if len(lat_indices) == 0 or len(lon_indices) == 0:
-            print(f"警告: 指定された中心点（緯度: {center_lat}, 経度: {center_lon}）から{region_size_km}km四方の領域が見つかりませんでした。")
-            print("全体マップを表示します。")
-            # 全体マップのプロット
-            plt.subplot(1, 1, 1)
-            im = plt.pcolormesh(lons, lats, ndvi, cmap=cmap, norm=norm)
-            plt.colorbar(im, label='NDVI')
-            
-            # 指定された中心点をマーク
-            plt.plot(center_lon, center_lat, 'ro', markersize=8, label='指定された中心点')
-            
-            # 領域の範囲を示す矩形を描画
-            lat_range = region_size_km / 111.0 / 2
-            lon_range = region_size_km / (111.0 * np.cos(np.radians(center_lat))) / 2
-            rect = Rectangle((center_lon - lon_range, center_lat - lat_range), 
-                            lon_range * 2, lat_range * 2, 
-                            linewidth=2, edgecolor='r', facecolor='none')
-            plt.gca().add_patch(rect)
-            
-            plt.legend()
-            
-            # 統計情報を全体から計算
-            valid_ndvi = ndvi[~np.ma.getmaskarray(ndvi)]
+            # 抽出領域の統計情報
+            valid_ndvi = np.ma.compressed(region_ndvi)
             if len(valid_ndvi) > 0:
+                # 統計量は1回だけ計算し、表示と辞書の両方に使う
+                summary = summarize_ndvi(valid_ndvi, region_ndvi.size)
+                print(f"\n抽出領域の統計情報:")
+                print(f"- 平均NDVI: {summary['平均NDVI']:.4f}")
+                print(f"- 最大NDVI: {summary['最大NDVI']:.4f}")
+                print(f"- 最小NDVI: {summary['最小NDVI']:.4f}")
+                print(f"- 中央値NDVI: {summary['中央値NDVI']:.4f}")
+                print(f"- 標準偏差: {summary['標準偏差']:.4f}")
+                print(f"- 有効ピクセル数: {summary['有効ピクセル数']}")
+                print(f"- 総ピクセル数: {summary['総ピクセル数']}")
+                print(f"- 有効データ率: {summary['有効データ率(%)']:.2f}%")
+            
+                # 統計情報を辞書に格納
                 stats = {
-                    "対象地域": f"全体（指定領域が見つからないため）",
+                    "対象地域": f"緯度{center_lat:.4f}°N, 経度{center_lon:.4f}°E 周辺 {region_size_km}km四方",
                     "中心緯度": center_lat,
                     "中心経度": center_lon,
                     "メッシュサイズ(km)": region_size_km,
                     "日付": date_str,
-                    "平均NDVI": float(np.mean(valid_ndvi)),
-                    "最大NDVI": float(np.max(valid_ndvi)),
-                    "最小NDVI": float(np.min(valid_ndvi)),
-                    "中央値NDVI": float(np.median(valid_ndvi)),
-                    "標準偏差": float(np.std(valid_ndvi)),
-                    "有効ピクセル数": int(len(valid_ndvi)),
-                    "総ピクセル数": int(ndvi.size),
-                    "有効データ率(%)": float(len(valid_ndvi) / ndvi.size * 100)
+                    **summary
                 }
         else:
-            # 抽出された領域のプロット
-            plt.subplot(1, 2, 1)
-            im1 = plt.pcolormesh(lons, lats, ndvi, cmap=cmap, norm=norm)
-            plt.colorbar(im1, label='NDVI')
+            if ndvi is None:
+                ndvi = read_ndvi(nc_data)
+        
+            # 統計情報を全体から計算
+            valid_ndvi = np.ma.compressed(ndvi)
+            if len(valid_ndvi) > 0:
+                if center_lat is not None and center_lon is not None:
+                    stats = {
+                        "対象地域": f"全体（指定領域が見つからないため）",
+                        "中心緯度": center_lat,
+                        "中心経度": center_lon,
+                        "メッシュサイズ(km)": region_size_km,
+                        "日付": date_str,
+                        **summarize_ndvi(valid_ndvi, ndvi.size)
+                    }
+                else:
+                    stats = {
+                        "対象地域": "全体",
+                        "日付": date_str,
+                        **summarize_ndvi(valid_ndvi, ndvi.size)
+                    }
+
+        # カラーマップの設定（植生表示に適したもの）
+        cmap = plt.cm.RdYlGn  # 赤-黄-緑のカラーマップ（植生によく使われる）
+        norm = colors.Normalize(vmin=-1, vmax=1)
+    
+        if save_raster:
+            save_ndvi_raster(lons, lats, ndvi, output_file, cmap, norm)
+            print(f"画像を保存しました: {output_file}")
+    
+        if make_plot:
+            # カラーバーは描画したマップではなく、カラーマップと正規化だけを持つオブジェクトから作る
+            # （大きなグリッドのデータをカラーバーのために参照しない。2つのパネルで同じものを使う）
+            sm = plt.cm.ScalarMappable(cmap=cmap, norm=norm)
+            sm.set_array([])
+
+            # 図の作成（複数のファイルを続けて処理する場合は、同じ図を消去して使い回す）
+            plt.figure(num='NDVI', figsize=(12, 8), clear=True)
+        
+            if center_lat is not None and center_lon is not None:
+                # 矩形の描画に使う領域の範囲（中心からの幅、度）は、どちらの場合も同じなので一度だけ計算する
+                # （1つの値の三角関数はNumPyよりmathの方が速い）
+                lat_range = region_size_km / 111.0 / 2
+                lon_range = region_size_km / (111.0 * math.cos(math.radians(center_lat))) / 2
+        
+            if center_lat is not None and center_lon is not None and not region_found:
+                # 全体マップのプロット
+                plt.subplot(1, 1, 1)
+                draw_ndvi_map(lons, lats, ndvi, cmap, norm)
+                plt.colorbar(sm, ax=plt.gca(), label='NDVI')
             
-            # 指定された中心点をマーク
-            plt.plot(center_lon, center_lat, 'ro', markersize=8)
+                # 指定された中心点をマーク
+                plt.plot(center_lon, center_lat, 'ro', markersize=8, label='指定された中心点')
             
-            # 領域の範囲を示す矩形を描画
-            lat_range = region_size_km / 111.0 / 2
-            lon_range = region_size_km / (111.0 * np.cos(np.radians(center_lat))) / 2
-            rect = Rectangle((center_lon - lon_range, center_lat - lat_range), 
-                            lon_range * 2, lat_range * 2, 
-                            linewidth=2, edgecolor='r', facecolor='none')
-            plt.gca().add_patch(rect)
+                # 領域の範囲を示す矩形を描画
+                rect = Rectangle((center_lon - lon_range, center_lat - lat_range), 
+                                lon_range * 2, lat_range * 2, 
+                                linewidth=2, edgecolor='r', facecolor='none')
+                plt.gca().add_patch(rect)
             
-            plt.title('全体マップ')
-            plt.xlabel('経度')
-            plt.ylabel('緯度')
-            plt.grid(True, linestyle='--', alpha=0.5)
+                plt.legend()
+            elif region_found:
+                # 抽出された領域のプロット
+                plt.subplot(1, 2, 1)
+                draw_ndvi_map(lons, lats, ndvi, cmap, norm)
+                plt.colorbar(sm, ax=plt.gca(), label='NDVI')
             
-            # 抽出された領域の拡大表示
-            plt.subplot(1, 2, 2)
-            region_lons = lons[lon_indices]
-            region_lats = lats[lat_indices]
-            region_ndvi = ndvi[np.ix_(lat_indices, lon_indices)]
+                # 指定された中心点をマーク
+                plt.plot(center_lon, center_lat, 'ro', markersize=8)
             
-            im2 = plt.pcolormesh(region_lons, region_lats, region_ndvi, cmap=cmap, norm=norm)
-            plt.colorbar(im2, label='NDVI')
-            plt.title(f'抽出領域（中心: {center_lat:.4f}°N, {center_lon:.4f}°E, 範囲: {region_size_km}km四方）')
-            plt.xlabel('経度')
-            plt.ylabel('緯度')
-            plt.grid(True, linestyle='--', alpha=0.5)
+                # 領域の範囲を示す矩形を描画
+                rect = Rectangle((center_lon - lon_range, center_lat - lat_range), 
+                                lon_range * 2, lat_range * 2, 
+                                linewidth=2, edgecolor='r', facecolor='none')
+                plt.gca().add_patch(rect)
             
-            # 抽出領域の統計情報
-            valid_ndvi = region_ndvi[~np.ma.getmaskarray(region_ndvi)]
-            if len(valid_ndvi) > 0:
-                print(f"\n抽出領域の統計情報:")
-                print(f"- 平均NDVI: {np.mean(valid_ndvi):.4f}")
-                print(f"- 最大NDVI: {np.max(valid_ndvi):.4f}")
-                print(f"- 最小NDVI: {np.min(valid_ndvi):.4f}")
-                print(f"- 中央値NDVI: {np.median(valid_ndvi):.4f}")
-                print(f"- 標準偏差: {np.std(valid_ndvi):.4f}")
-                print(f"- 有効ピクセル数: {len(valid_ndvi)}")
-                print(f"- 総ピクセル数: {region_ndvi.size}")
-                print(f"- 有効データ率: {len(valid_ndvi) / region_ndvi.size * 100:.2f}%")
-                
-                # 統計情報を辞書に格納
-                stats = {
-                    "対象地域": f"緯度{center_lat:.4f}°N, 経度{center_lon:.4f}°E 周辺 {region_size_km}km四方",
-                    "中心緯度": center_lat,
-                    "中心経度": center_lon,
-                    "メッシュサイズ(km)": region_size_km,
-                    "日付": date_str,
-                    "平均NDVI": float(np.mean(valid_ndvi)),
-                    "最大NDVI": float(np.max(valid_ndvi)),
-                    "最小NDVI": float(np.min(valid_ndvi)),
-                    "中央値NDVI": float(np.median(valid_ndvi)),
-                    "標準偏差": float(np.std(valid_ndvi)),
-                    "有効ピクセル数": int(len(valid_ndvi)),
-                    "総ピクセル数": int(region_ndvi.size),
-                    "有効データ率(%)": float(len(valid_ndvi) / region_ndvi.size * 100)
-                }
-    else:
-        # 全体マップのプロット
-        plt.subplot(1, 1, 1)
-        im = plt.pcolormesh(lons, lats, ndvi, cmap=cmap, norm=norm)
-        plt.colorbar(im, label='NDVI')
-        plt.title(f'正規化植生指数 (NDVI) - {date_str}')
-        plt.xlabel('経度')
-        plt.ylabel('緯度')
-        plt.grid(True, linestyle='--', alpha=0.5)
+                plt.title('全体マップ')
+                plt.xlabel('経度')
+                plt.ylabel('緯度')
+                plt.grid(True, linestyle='--', alpha=0.5)
+            
+                # 抽出された領域の拡大表示
+                plt.subplot(1, 2, 2)
+                region_lons = lons[lon_slice]
+                region_lats = lats[lat_slice]
+            
+                draw_ndvi_map(region_lons, region_lats, region_ndvi, cmap, norm)
+                plt.colorbar(sm, ax=plt.gca(), label='NDVI')
+                plt.title(f'抽出領域（中心: {center_lat:.4f}°N, {center_lon:.4f}°E, 範囲: {region_size_km}km四方）')
+                plt.xlabel('経度')
+                plt.ylabel('緯度')
+                plt.grid(True, linestyle='--', alpha=0.5)
+            else:
+                # 全体マップのプロット
+                plt.subplot(1, 1, 1)
+                draw_ndvi_map(lons, lats, ndvi, cmap, norm)
+                plt.colorbar(sm, ax=plt.gca(), label='NDVI')
+                plt.title(f'正規化植生指数 (NDVI) - {date_str}')
+                plt.xlabel('経度')
+                plt.ylabel('緯度')
+                plt.grid(True, linestyle='--', alpha=0.5)
+
+            # 図の保存と表示
+            plt.tight_layout()
         
-        # 全体の統計情報
-        valid_ndvi = ndvi[~np.ma.getmaskarray(ndvi)]
-        if len(valid_ndvi) > 0:
-            stats = {
-                "対象地域": "全体",
-                "日付": date_str,
-                "平均NDVI": float(np.mean(valid_ndvi)),
-                "最大NDVI": float(np.max(valid_ndvi)),
-                "最小NDVI": float(np.min(valid_ndvi)),
-                "中央値NDVI": float(np.median(valid_ndvi)),
-                "標準偏差": float(np.std(valid_ndvi)),
-                "有効ピクセル数": int(len(valid_ndvi)),
-                "総ピクセル数": int(ndvi.size),
-                "有効データ率(%)": float(len(valid_ndvi) / ndvi.size * 100)
-            }
-
-    # 図の保存と表示
-    plt.tight_layout()
-    
-    if output_file:
-        plt.savefig(output_file, dpi=300)
-        print(f"画像を保存しました: {output_file}")
-    
-    if show_plot:
-        plt.show()
-    
-    # ファイルを閉じる
-    nc_data.close()
+            if output_file and not save_raster:
+                plt.savefig(output_file, dpi=300)
+                print(f"画像を保存しました: {output_file}")
+        
+            if show_plot:
+                plt.show()
+    finally:
+        # ファイルを閉じる（処理に失敗した場合も閉じる）
+        nc_data.close()
     
     print("処理が完了しました。")
     
     # NDVI統計情報を返す
     return stats
 
+def visualize_many(nc_file_paths, output_files=None, workers=1, **kwargs):
+    """
+    複数のNetCDFファイルをPythonを起動し直さずに続けて可視化する関数
+    
+    フォントの設定は最初の1回だけ行い、図は同じものを使い回す。
+    workersが2以上の場合は、ファイルごとに別プロセスで並列に処理する
+    （圧縮されたファイルの展開とNDVIの計算がCPUを使うため）。
+    
+    Args:
+        nc_file_paths (list): NetCDFファイルのパスのリスト
+        output_files (list, optional): 各ファイルの出力画像ファイルのパスのリスト
+        workers (int): 並列処理のプロセス数（1の場合は逐次処理）
+        **kwargs: visualize_ndviに渡すその他の引数
+    
+    Returns:
+        list: ファイルごとのNDVI統計情報のリスト（処理に失敗したファイルはNone）
+    """
+    if output_files is None:
+        output_files = [None] * len(nc_file_paths)
+    
+    if workers > 1:
+        # 別プロセスではプロットを表示できないため、表示は行わない
+        kwargs['show_plot'] = False
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(visualize_ndvi, nc_file_path, output_file, **kwargs)
+                       for nc_file_path, output_file in zip(nc_file_paths, output_files)]
+            all_stats = []
+            for nc_file_path, future in zip(nc_file_paths, futures):
+                try:
+                    all_stats.append(future.result())
+                except Exception as e:
+                    print(f"エラー: {nc_file_path} の処理に失敗しました: {e}", file=sys.stderr)
+                    all_stats.append(None)
+        return all_stats
+    
+    setup_japanese_font()
+    all_stats = []
+    for nc_file_path, output_file in zip(nc_file_paths, output_files):
+        try:
+            all_stats.append(visualize_ndvi(nc_file_path, output_file, **kwargs))
+        except Exception as e:
+            print(f"エラー: {nc_file_path} の処理に失敗しました: {e}", file=sys.stderr)
+            all_stats.append(None)
+    return all_stats
+
 def main():
     # コマンドライン引数の設定
     parser = argparse.ArgumentParser(description='NetCDFファイルから植生指数（NDVI）を計算して可視化するスクリプト')
-    parser.add_argument('--file', '-f', type=str, 
-                        default='example/AVHRR-Land_v005_AVH09C1_NOAA-11_19900101_c20170614215223.nc',
-                        help='処理するNetCDFファイルのパス')
+    parser.add_argument('--file', '-f', type=str, nargs='+', 
+                        default=['example/AVHRR-Land_v005_AVH09C1_NOAA-11_19900101_c20170614215223.nc'],
+                        help='処理するNetCDFファイルのパス（複数指定可）')
     parser.add_argument('--output', '-o', type=str, 
-                        help='出力画像ファイルのパス（指定しない場合はファイル名から自動生成）')
+                        help='出力画像ファイルのパス（指定しない場合はファイル名から自動生成、複数のファイルを処理する場合は出力ディレクトリ）')
     parser.add_argument('--no-display', '-n', action='store_true',
                         help='プロットを表示しない（バッチ処理用）')
     parser.add_argument('--lat', '-y', type=float,
@@ -444,6 +851,12 @@ def main():
                         help='抽出する領域のサイズ（km）（デフォルト: 20km）')
     parser.add_argument('--ndvi-stats', '-s', action='store_true',
                         help='NDVI統計情報をCSVファイルに出力する')
+    parser.add_argument('--raster', '-i', action='store_true',
+                        help='全体マップを図ではなくNDVIの画像（1セル1画素）として保存する')
+    parser.add_argument('--workers', '-w', type=int, default=1,
+                        help='複数のファイルを処理する場合の並列処理のプロセス数（デフォルト: 1）')
+    parser.add_argument('--verbose', '-v', action='store_true',
+                        help='反射率データの変数の属性を表示する')
     
     # 引数がない場合は簡易ヘルプを表示
     if len(sys.argv) == 1:
@@ -451,13 +864,16 @@ def main():
         print("\n基本的な使い方:")
         print("  python netcdf_visualizer.py -f <NetCDFファイル> [オプション]")
         print("\n主なオプション:")
-        print("  -f, --file <ファイル>      処理するNetCDFファイルのパス")
-        print("  -o, --output <ファイル>    出力画像ファイルのパス")
+        print("  -f, --file <ファイル>...   処理するNetCDFファイルのパス（複数指定可）")
+        print("  -o, --output <ファイル>    出力画像ファイルのパス（複数のファイルの場合は出力ディレクトリ）")
         print("  -n, --no-display          プロットを表示しない")
         print("  -y, --lat <緯度>          抽出する領域の中心緯度（例: 35.6895 for 東京）")
         print("  -x, --lon <経度>          抽出する領域の中心経度（例: 139.6917 for 東京）")
         print("  -r, --region-size <サイズ> 抽出する領域のサイズ（km）（デフォルト: 20km）")
         print("  -s, --ndvi-stats          NDVI統計情報をCSVファイルに出力する")
+        print("  -i, --raster              全体マップをNDVIの画像（1セル1画素）として保存する")
+        print("  -w, --workers <数>        複数のファイルを並列に処理するプロセス数")
+        print("  -v, --verbose             反射率データの変数の属性を表示する")
         print("\n詳細なヘルプを表示するには:")
         print("  python netcdf_visualizer.py -h")
         print("\n日本の主要都市の緯度経度:")
@@ -469,48 +885,72 @@ def main():
     
     args = parser.parse_args()
     
+    # プロットを表示しない場合は、対話的なバックエンドを初期化しない
+    if args.no_display:
+        mpl.use('Agg')
+    
     # ファイルの存在確認
-    if not os.path.exists(args.file):
-        print(f"エラー: 指定されたファイル '{args.file}' が見つかりません。")
+    nc_files = []
+    missing_files = []
+    for nc_file in args.file:
+        if os.path.exists(nc_file):
+            nc_files.append(nc_file)
+        else:
+            print(f"エラー: 指定されたファイル '{nc_file}' が見つかりません。", file=sys.stderr)
+            missing_files.append(nc_file)
+    if not nc_files:
         print("正しいファイルパスを指定するか、ファイルをダウンロードしてください。")
         print("\nファイルのダウンロード方法:")
         print("  python download_nc_files.py --help")
-        return
-    
-    # 入力ファイルのディレクトリとファイル名を取得
-    input_dir = os.path.dirname(os.path.abspath(args.file))
-    base_name = os.path.splitext(os.path.basename(args.file))[0]
-    
-    # 出力ファイル名が指定されていない場合は自動生成
-    output_file = args.output
-    if not output_file:
+        sys.exit(1)
+    
+    # 出力ファイル名の決定（複数のファイルを指定した場合、--outputは出力ディレクトリとして扱う）
+    # （見つからないファイルを除いた数ではなく、指定されたファイルの数で判断する）
+    region_str = ""
+    if args.lat and args.lon:
+        region_str = f"_region_lat{args.lat:.4f}_lon{args.lon:.4f}_{args.region_size}km"
+    output_files = []
+    for nc_file in nc_files:
+        base_name = os.path.splitext(os.path.basename(nc_file))[0]
+        if args.output and len(args.file) == 1:
+            output_file = args.output
+        elif args.output:
+            output_file = os.path.join(args.output, f"{base_name}{region_str}_ndvi.png")
+        else:
+            # 出力先が指定されていない場合は入力ファイルと同じディレクトリのndvi_resultsフォルダ
+            input_dir = os.path.dirname(os.path.abspath(nc_file))
+            output_file = os.path.join(input_dir, "ndvi_results", f"{base_name}{region_str}_ndvi.png")
+        
         # 出力ディレクトリの作成（必要に応じて）
-        output_dir = os.path.join(input_dir, "ndvi_results")
+        output_dir = os.path.dirname(os.path.abspath(output_file))
         if not os.path.exists(output_dir):
-            os.makedirs(output_dir)
+            os.makedirs(output_dir, exist_ok=True)
             print(f"出力ディレクトリを作成しました: {output_dir}")
         
-        region_str = ""
-        if args.lat and args.lon:
-            region_str = f"_region_lat{args.lat:.4f}_lon{args.lon:.4f}_{args.region_size}km"
-        output_file = os.path.join(output_dir, f"{base_name}{region_str}_ndvi.png")
-    else:
-        # 出力ファイルが指定されている場合、そのディレクトリを確認して作成
-        output_dir = os.path.dirname(os.path.abspath(output_file))
-        if output_dir and not os.path.exists(output_dir):
-            os.makedirs(output_dir)
-            print(f"出力ディレクトリを作成しました: {output_dir}")
-    
-    print(f"出力ファイル: {output_file}")
+        print(f"出力ファイル: {output_file}")
+        output_files.append(output_file)
     
     # 可視化の実行
-    stats = visualize_ndvi(args.file, output_file, not args.no_display, args.lat, args.lon, args.region_size, args.ndvi_stats)
+    all_stats = visualize_many(nc_files, output_files, args.workers, 
+                               show_plot=not args.no_display, 
+                               center_lat=args.lat, 
+                               center_lon=args.lon, 
+                               region_size_km=args.region_size, 
+                               ndvi_stats=args.ndvi_stats, 
+                               raster=args.raster,
+                               verbose=args.verbose)
     
     # NDVI統計情報をCSVファイルに出力
-    if args.ndvi_stats and stats:
-        # 出力ファイル名の生成
-        stats_file = os.path.splitext(output_file)[0] + "_stats.csv"
-        save_ndvi_stats(stats, stats_file)
+    if args.ndvi_stats:
+        for output_file, stats in zip(output_files, all_stats):
+            if stats:
+                # 出力ファイル名の生成
+                stats_file = os.path.splitext(output_file)[0] + "_stats.csv"
+                save_ndvi_stats(stats, stats_file)
+    
+    # 見つからない、または処理に失敗したファイルがある場合は、終了コード1で終了する
+    if missing_files or any(stats is None for stats in all_stats):
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file